@@ -6,6 +6,7 @@ The Hub replies with a JSON model describing the authenticated user.
 authenticate with the Hub.
 """
 import base64
+import functools
 import hashlib
 import json
 import os
@@ -16,10 +17,13 @@ import string
 import time
 import uuid
 import warnings
+from collections import OrderedDict
 from unittest import mock
 from urllib.parse import urlencode
+from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
 from tornado.httputil import url_concat
 from tornado.log import app_log
 from tornado.web import HTTPError
@@ -38,6 +42,23 @@ from ..scopes import _intersect_expanded_scopes
 from ..utils import url_path_join
 
 
+try:
+    _monotonic_ns = time.monotonic_ns
+except AttributeError:
+    # Python < 3.7
+    def _monotonic_ns():
+        return int(time.monotonic() * 1_000_000_000)
+
+
+@functools.lru_cache(maxsize=4096)
+def _cached_intersect(required_scopes, scopes):
+    """Memoized _intersect_expanded_scopes for frozensets of scopes
+    The result only depends on the two sets,
+    and the same handler checks the same scopes over and over.
+    """
+    return frozenset(_intersect_expanded_scopes(set(required_scopes), set(scopes)))
+
+
 def check_scopes(required_scopes, scopes):
     """Check that required_scope(s) are in scopes
     Returns the subset of scopes matching required_scopes,
@@ -59,66 +80,154 @@ def check_scopes(required_scopes, scopes):
         and falsy otherwise.
     """
     if isinstance(required_scopes, str):
-        required_scopes = {required_scopes}
+        required_scopes = (required_scopes,)
+    # frozen so they can be used as keys of the _cached_intersect cache
+    required_scopes = frozenset(required_scopes)
+    scopes = frozenset(scopes)
+
+    if not required_scopes or not scopes:
+        return set()
+    if scopes.issuperset(required_scopes) and not any(
+        '!' in scope for scope in required_scopes
+    ):
+        # exact match without filters, nothing to resolve
+        return set(required_scopes)
 
-    intersection = _intersect_expanded_scopes(required_scopes, scopes)
+    intersection = _cached_intersect(required_scopes, scopes)
     # re-intersect with required_scopes in case the intersection
     # applies stricter filters than required_scopes declares
     # e.g. required_scopes = {'read:users'} and intersection has only {'read:users!user=x'}
-    return set(required_scopes) & intersection
+    if len(required_scopes) == 1:
+        # common case: a single required scope is a membership check
+        (scope,) = required_scopes
+        return {scope} if scope in intersection else set()
+    return set(required_scopes & intersection)
 
 
 class _ExpiringDict(dict):
     """Dict-like cache for Hub API requests
     Values will expire after max_age seconds.
-    A monotonic timer is used (time.monotonic).
+    A monotonic timer is used (in integer nanoseconds).
     A max_age of 0 means cache forever.
+    At most max_size entries are kept, evicting the least recently used.
+    A max_size of 0 means no limit.
+    Entries are stored as ``key: (expiry_ns, value)``,
+    where an expiry of None means the entry never expires.
+    Because max_age is the same for every entry, the store is (close to) expiry order,
+    so expired entries are pruned from the front of the store
+    instead of lingering until they are looked up again.
+    Entries moved to the back by a cache hit are still checked on access.
+    There is no lock: every step is a single dict operation,
+    which is atomic under the GIL, and tolerates a key
+    being removed concurrently by another thread.
     """
 
     max_age = 0
+    max_size = 0
 
-    def __init__(self, max_age=0):
+    def __init__(self, max_age=0, max_size=0):
         self.max_age = max_age
-        self.timestamps = {}
-        self.values = {}
+        self.max_age_ns = int(max_age * 1_000_000_000)
+        self.max_size = max_size
+        self._store = OrderedDict()
+        # expiry of the entry at the front of the store when last swept,
+        # so a sweep with nothing to do is a single int compare.
+        # 0 means unknown (check the front again).
+        self._earliest_expiry_ns = 0
 
     def __setitem__(self, key, value):
-        """Store key and record timestamp"""
-        self.timestamps[key] = time.monotonic()
-        self.values[key] = value
+        """Store key and record expiry"""
+        self._sweep()
+        if self.max_age_ns > 0:
+            expiry = _monotonic_ns() + self.max_age_ns
+        else:
+            expiry = None
+        self._store[key] = (expiry, value)
+        # keep insertion order == expiry order when a key is refreshed
+        self._move_to_end(key)
+        if self.max_size:
+            while len(self._store) > self.max_size:
+                try:
+                    self._store.popitem(last=False)
+                except KeyError:
+                    break
+                self._earliest_expiry_ns = 0
+
+    def _move_to_end(self, key):
+        try:
+            self._store.move_to_end(key)
+        except KeyError:
+            # removed by another thread
+            pass
 
     def __repr__(self):
-        """include values and timestamps in repr"""
-        now = time.monotonic()
+        """include values and remaining time in repr"""
+        now = _monotonic_ns()
         return repr(
             {
-                key: '{value} (age={age:.0f}s)'.format(
-                    value=repr(value)[:16] + '...', age=now - self.timestamps[key]
+                key: '{value} (expires={expires})'.format(
+                    value=repr(value)[:16] + '...',
+                    expires='never'
+                    if expiry is None
+                    else '{:.0f}s'.format((expiry - now) / 1e9),
                 )
-                for key, value in self.values.items()
+                for key, (expiry, value) in self._store.items()
             }
         )
 
-    def _check_age(self, key):
-        """Check timestamp for a key"""
-        if key not in self.values:
-            # not registered, nothing to do
+    def _sweep(self):
+        """Drop expired entries from the front of the store"""
+        if not self.max_age_ns:
+            return
+        now = _monotonic_ns()
+        if self._earliest_expiry_ns >= now:
             return
-        now = time.monotonic()
-        timestamp = self.timestamps[key]
-        if self.max_age > 0 and timestamp + self.max_age < now:
-            self.values.pop(key)
-            self.timestamps.pop(key)
+        while True:
+            try:
+                key = next(iter(self._store))
+            except (StopIteration, RuntimeError):
+                # empty (or changed under us), the next sweep sets the bound again
+                self._earliest_expiry_ns = 0
+                return
+            entry = self._store.get(key)
+            if entry is None:
+                # removed by another thread
+                continue
+            expiry = entry[0]
+            if expiry is None:
+                self._earliest_expiry_ns = 0
+                return
+            if expiry >= now:
+                self._earliest_expiry_ns = expiry
+                return
+            self._store.pop(key, None)
+
+    def _check_age(self, key, entry):
+        """Check expiry for a key's (expiry, value) entry
+        Returns False (and drops the key) if the entry has expired.
+        """
+        expiry = entry[0]
+        if expiry is not None and expiry < _monotonic_ns():
+            self._store.pop(key, None)
+            self._earliest_expiry_ns = 0
+            return False
+        return True
 
     def __contains__(self, key):
         """dict check for `key in dict`"""
-        self._check_age(key)
-        return key in self.values
+        self._sweep()
+        entry = self._store.get(key)
+        return entry is not None and self._check_age(key, entry)
 
     def __getitem__(self, key):
         """Check age before returning value"""
-        self._check_age(key)
-        return self.values[key]
+        self._sweep()
+        entry = self._store[key]
+        if not self._check_age(key, entry):
+            raise KeyError(key)
+        # mark as recently used
+        self._move_to_end(key)
+        return entry[1]
 
     def get(self, key, default=None):
         """dict-like get:"""
@@ -129,8 +238,8 @@ class _ExpiringDict(dict):
 
     def clear(self):
         """Clear the cache"""
-        self.values.clear()
-        self.timestamps.clear()
+        self._store.clear()
+        self._earliest_expiry_ns = 0
 
 
 class HubAuth(SingletonConfigurable):
@@ -206,6 +315,18 @@ class HubAuth(SingletonConfigurable):
         """,
     ).tag(config=True)
 
+    # Authorization header value for api_token,
+    # built once instead of on every API request
+    _auth_header_value = Unicode()
+
+    @default('_auth_header_value')
+    def _default_auth_header_value(self):
+        return 'token %s' % self.api_token
+
+    @observe('api_token')
+    def _rebuild_auth_header_value(self, change):
+        self._auth_header_value = 'token %s' % change.new
+
     hub_prefix = Unicode(
         '/hub/',
         help="""The URL prefix for the Hub itself.
@@ -283,11 +404,35 @@ class HubAuth(SingletonConfigurable):
         Default: 300 (five minutes)
         """,
     ).tag(config=True)
+    cache_max_size = Integer(
+        10000,
+        help="""The maximum number of Hub responses to cache for authentication.
+        When the cache is full, the least recently used response is dropped.
+        Set to 0 for no limit.
+        Default: 10000
+        """,
+    ).tag(config=True)
     cache = Instance(_ExpiringDict, allow_none=False)
 
     @default('cache')
     def _default_cache(self):
-        return _ExpiringDict(self.cache_max_age)
+        return _ExpiringDict(self.cache_max_age, self.cache_max_size)
+
+    negative_cache_max_age = Integer(
+        30,
+        help="""The maximum time (in seconds) to cache failed authentication with the Hub.
+        Failures are cached separately from successful responses,
+        so that many unknown tokens cannot evict cached users,
+        and a token the Hub did not recognize recovers quickly.
+        Set to 0 to cache failures with the successful responses, for cache_max_age.
+        Default: 30
+        """,
+    ).tag(config=True)
+    negative_cache = Instance(_ExpiringDict, allow_none=False)
+
+    @default('negative_cache')
+    def _default_negative_cache(self):
+        return _ExpiringDict(self.negative_cache_max_age, self.cache_max_size)
 
     oauth_scopes = Set(
         Unicode(),
@@ -305,6 +450,18 @@ class HubAuth(SingletonConfigurable):
         if service_name:
             return {f'access:services!service={service_name}'}
         return set()
+
+    _session = Instance(requests.Session)
+
+    @default('_session')
+    def _default_session(self):
+        # one Session per HubAuth, so repeated requests to the Hub
+        # reuse keep-alive connections instead of a new TCP/TLS handshake each time
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50)
+        session.mount(urlparse(self.api_url).scheme + '://', adapter)
+        return session
+
     def _check_hub_authorization(self, url, api_token, cache_key=None, use_cache=True):
         """Identify a user with the Hub
         Args:
@@ -322,6 +479,10 @@ class HubAuth(SingletonConfigurable):
             # check for a cached reply, so we don't check with the Hub if we don't have to
             try:
                 return self.cache[cache_key]
+            except KeyError:
+                pass
+            try:
+                return self.negative_cache[cache_key]
             except KeyError:
                 app_log.debug("HubAuth cache miss: %s", cache_key)
 
@@ -337,20 +498,23 @@ class HubAuth(SingletonConfigurable):
             app_log.debug("Received request from Hub user %s", data)
         if use_cache:
             # cache result
-            self.cache[cache_key] = data
+            if data is None and self.negative_cache_max_age:
+                self.negative_cache[cache_key] = data
+            else:
+                self.cache[cache_key] = data
         return data
 
     def _api_request(self, method, url, **kwargs):
         """Make an API request"""
         allow_403 = kwargs.pop('allow_403', False)
         headers = kwargs.setdefault('headers', {})
-        headers.setdefault('Authorization', 'token %s' % self.api_token)
+        headers.setdefault('Authorization', self._auth_header_value)
         if "cert" not in kwargs and self.certfile and self.keyfile:
             kwargs["cert"] = (self.certfile, self.keyfile)
             if self.client_ca:
                 kwargs["verify"] = self.client_ca
         try:
-            r = requests.request(method, url, **kwargs)
+            r = self._session.request(method, url, **kwargs)
         except requests.ConnectionError as e:
             app_log.error("Error connecting to %s: %s", self.api_url, e)
             msg = "Failed to connect to Hub API at %r." % self.api_url
@@ -408,7 +572,8 @@ class HubAuth(SingletonConfigurable):
             data = r.json()
 
         return data
-def user_for_cookie(self, encrypted_cookie, use_cache=True, session_id=''):
+
+    def user_for_cookie(self, encrypted_cookie, use_cache=True, session_id=''):
         """Deprecated and removed. Use HubOAuth to authenticate browsers."""
         raise RuntimeError(
             "Identifying users by shared cookie is removed in JupyterHub 2.0. Use OAuth tokens."
@@ -504,7 +669,7 @@ def user_for_cookie(self, encrypted_cookie, use_cache=True, session_id=''):
 
     def check_scopes(self, required_scopes, user):
         """Check whether the user has required scope(s)"""
-        return check_scopes(required_scopes, set(user["scopes"]))
+        return check_scopes(required_scopes, user["scopes"])
 
 
 class HubOAuth(HubAuth):
@@ -541,7 +706,8 @@ class HubOAuth(HubAuth):
         This cookie is only live for the duration of the OAuth handshake.
         """
         return self.cookie_name + '-oauth-state'
- def _get_user_cookie(self, handler):
+
+    def _get_user_cookie(self, handler):
         token = handler.get_secure_cookie(self.cookie_name)
         session_id = self.get_session_id(handler)
         if token:
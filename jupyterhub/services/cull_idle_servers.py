@@ -30,16 +30,18 @@ the ''--cull-users'' option.
 """
 
 
+import asyncio
 from datetime import datetime
+from datetime import timedelta
 from datetime import timezone
+from functools import lru_cache
 from functools import partial
 import json
 import os
-from dateutil.parser import parse as parse_date
-from tornado.gen import coroutine, multi
 from tornado.locks import Semaphore
 from tornado.log import app_log
 from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.httputil import url_concat
 from tornado.ioloop import IOLoop, PeriodicCallback
 from tornado.options import define, options, parse_command_line
 
@@ -48,18 +50,47 @@ try:
 except ImportError:
     from urllib import quote
 
+try:
+    _fromisoformat = datetime.fromisoformat
+except AttributeError:
+    # Python < 3.7
+    from dateutil.parser import parse as _fromisoformat
+
+# number of users to request per page from the Hub.
+# The Hub caps this at its own api_page_max_limit.
+USER_PAGE_SIZE = 200
+
 def parse_date(date_string):
     """Parse a timestamp
 
     If it doesn't have a timezone, assume utc
     Returned datetime object will always be a timezone-aware
+
+    The Hub always sends ISO-8601 timestamps,
+    so use the C datetime.fromisoformat instead of dateutil where available
     """
-    dt =dateutil.parser.parse(date_string)
+    if date_string.endswith('Z'):
+        # fromisoformat only accepts 'Z' from Python 3.11
+        date_string = date_string[:-1] + '+00:00'
+    dt = _fromisoformat(date_string)
     if not dt.tzinfo:
         #assume naive timestamps are UTC
         dt =dt.replace(tzinfo=timezone.utc)
     return dt
 
+@lru_cache(maxsize=1024)
+def _format_seconds(seconds):
+    """Format a number of seconds as HH:MM:SS
+
+    Cached, since many servers share the same whole-second ages
+    """
+    h = seconds //3600
+    seconds = seconds % 3600
+    m = seconds //60
+    seconds = seconds % 60
+    return "{h:02}:{m:02}:{seconds:02}".format(h=h,m=m,seconds=seconds)
+
+
 def format_td(td):
     """Nicely format a timedelta objects
 
@@ -69,51 +100,48 @@ def format_td(td):
         return "unknown"
     if isinstance(td,str):
         return td
-    seconds = int(td.total_seconds())
-    h = seconds //3600
-    seconds = seconds % 3600
-    m = seconds //60
-    seconds = seconds % 60
-    return "{h:02}:{m:02}:{seconds:02}".format(h=h,m=m,seconds=seconds)
+    return _format_seconds(int(td.total_seconds()))
 
 
-@coroutine
-def cull_idle(url, api_token, inactive_limit, cull_users=False, max_age=0,concurrency=10):
+async def cull_idle(url, api_token, inactive_limit, cull_users=False, max_age=0,concurrency=10):
     """cull idle single-user
     If cul_users,inactive *users* will be deleted as well.
     """
     auth_header = {
             'Authorization': 'token %s' % api_token
         }
-    req = HTTPRequest(url=url + '/users',
-        headers=auth_header,
+    users_url = url + '/users/'
+    now = datetime.now(timezone.utc)
+    # ISO-8601 UTC timestamps sort like the times they represent,
+    # so recent activity can be spotted without parsing.
+    # Compare to the second, so differing fractional digits can't mislead.
+    cull_limit_str = (now - timedelta(seconds=inactive_limit)).strftime(
+        '%Y-%m-%dT%H:%M:%S'
     )
-    now = datetime.datetime.utcnow()
-    cull_limit = now - datetime.timedelta(seconds=timeout)
+
+    def recently_active(timestamp):
+        """Whether a Hub UTC timestamp is newer than the inactivity limit"""
+        return bool(
+            timestamp
+            and timestamp.endswith('Z')
+            and timestamp[:19] > cull_limit_str
+        )
+
     client = AsyncHTTPClient()
 
-    If concurrency:
+    if concurrency:
         semaphore = Semaphore(concurrency)
 
-        @coroutine
-        def fetch(req):
+        async def fetch(req):
             """
             client.fetch wrapped in a semaphore to limit concurrency
             """
-            yield semaphore.acquire()
-            try:
-                return (yield.client.fetch(req))
-            finally:
-                yield semaphore.release()
+            async with semaphore:
+                return await client.fetch(req)
     else:
-        fetc = client.fetch
-
-    resp = yield client.fetch(req)
-    users = json.loads(resp.body.decode('utf8', 'replace'))
-    futures = []
+        fetch = client.fetch
 
-    @ccotoutine
-    def handle_server(user,server_name,server,max_age,inactive_limit):
+    async def handle_server(user,quoted_name,server_name,server,max_age,inactive_limit):
         """
         Handle culling a single servers
 
@@ -139,6 +167,13 @@ def cull_idle(url, api_token, inactive_limit, cull_users=False, max_age=0,concur
             app_log.warning("Not culling not ready not pending server %s: %s", log_name,server)
             return False
 
+        if not max_age and recently_active(server['last_activity']):
+            # active servers are the majority, skip parsing their timestamps
+            app_log.debug(
+            "Not culling server %s (last active: %s)", log_name, server['last_activity']
+            )
+            return False
+
         if server.get('started'):
             age = now - parse_date(server['started'])
         else:
@@ -154,7 +189,7 @@ def cull_idle(url, api_token, inactive_limit, cull_users=False, max_age=0,concur
             # last_activity may be None with Jupyterhub 0.9
             # which introduces the 'started' field which is never None
             # forrunning servers
-            inactive =max_age
+            inactive = age
 
 
         #######################################################################
@@ -183,8 +218,8 @@ def cull_idle(url, api_token, inactive_limit, cull_users=False, max_age=0,concur
         if max_age and not should_cull:
             # only check started if max_age is unspecified# so that we can still be compatible with Jupyterhub 0.9
             # which doesn't define the started' field
-            if age is not None and age.total_seconds() >- max_age:
-                pp_log.info(
+            if age is not None and age.total_seconds() >= max_age:
+                app_log.info(
                 "Culling server  %s (age: %s, inactive for %s)",
                 log_name,
                 format_td(age),
@@ -195,30 +230,26 @@ def cull_idle(url, api_token, inactive_limit, cull_users=False, max_age=0,concur
             app_log.debug(
             "Not culling server %s (age; %s, inactive for %s)",
             log_name,
-            format_td(age)
-            format_td(inactive)
+            format_td(age),
+            format_td(inactive),
             )
             return False
 
         if server_name:
             # culling a named servers
-            delete_url = url + "/users/%s/servers/%s" % (
-                quote(user['name']),
-                quote(server['name']),
-            )
+            delete_url = users_url + quoted_name + '/servers/' + quote(server_name)
         else:
-            delete_url = url + '/users/%s/server' % quote(user['name'])
+            delete_url = users_url + quoted_name + '/server'
 
         req = HTTPRequest(url=delete_url, method='DELETE', headers =auth_header)
-        resp = yield fetch(req)
+        resp = await fetch(req)
         if resp.code ==202:
             app_log.warning("Server  %s is slow to stop", log_name)
             # return False to prevent culling user with pending shutdowns
             return False
         return True
 
-    @coroutine
-    def handle_user(user):
+    async def handle_user(user):
 
         """
         Handle one user.
@@ -231,7 +262,10 @@ def cull_idle(url, api_token, inactive_limit, cull_users=False, max_age=0,concur
         # jupyerhub 0.9 always provides a 'servers' model.
         # 0.8 only does this when named servers are enabled.
 
-        if 'servers' in user;
+        # quote the name once for all of the user's servers
+        quoted_name = quote(user['name'])
+
+        if 'servers' in user:
             servers = user['servers']
         else:
             # jupyterhub <0.9 without named servers enabled.
@@ -242,16 +276,16 @@ def cull_idle(url, api_token, inactive_limit, cull_users=False, max_age=0,concur
 
             if user['server']:
                 servers[''] = {
-                'last_activity': user['ast_activity'],
+                'last_activity': user['last_activity'],
                 'pending': user['pending'],
                 'url' : user['server'],
                                 }
         server_futures = [
-            handle_server(user,server_name,server,max_age,inactive_limit)
+            handle_server(user,quoted_name,server_name,server,max_age,inactive_limit)
             for server_name, server in servers.items()
 
         ]
-        results = yield multi(server_futures)
+        results = await asyncio.gather(*server_futures)
         if not cull_users:
             return
         # some servers are still running, cannot cull users
@@ -264,6 +298,12 @@ def cull_idle(url, api_token, inactive_limit, cull_users=False, max_age=0,concur
             )
             return False
 
+        if not max_age and recently_active(user['last_activity']):
+            app_log.debug(
+            "Not culling user %s (last active: %s)", user['name'], user['last_activity']
+            )
+            return False
+
         should_cull = False
         if user.get('created'):
             age = now - parse_date(user['created'])
@@ -311,24 +351,82 @@ def cull_idle(url, api_token, inactive_limit, cull_users=False, max_age=0,concur
             return False
 
         req = HTTPRequest(
-        url=url + '/users/%s' %user['name'], method='DELETE', headers=auth_header
+        url=users_url + quoted_name, method='DELETE', headers=auth_header
 
         )
-        yield fetch(req)
+        await fetch(req)
         return True
 
-    for user in users:
-        futures.append((user['name'],handle_user(user)))#
-
-    for (name,f) in futures:
+    async def log_user(user):
+        """
+        Handle one user, logging the outcome as soon as it is known.
+        """
+        name = user['name']
         try:
-            result = yield f
+            result = await handle_user(user)
         except Exception:
             app_log.exception("Error processing %s", name)
         else:
             if result:
                 app_log.debug("Finished culling %s", name)
 
+    users = []
+
+    def add_user(user):
+        """Collect one user from the user list"""
+        # Users without running servers have nothing to cull unless we cull users.
+        # Users can't be skipped on their own last_activity:
+        # it is the newest of their servers', so idle named servers would be missed.
+        if cull_users or user.get('servers') or user.get('server'):
+            users.append(user)
+
+    params = {'limit': USER_PAGE_SIZE}
+    if not cull_users:
+        # only users with running servers can have anything to cull
+        params['state'] = 'active'
+    # ask for a paginated reply (ignored by JupyterHub < 2.0)
+    # and a gzipped body, decompressed by the client
+    users_headers = dict(auth_header)
+    users_headers['Accept'] = 'application/jupyterhub-pagination+json'
+    users_headers['Accept-Encoding'] = 'gzip'
+
+    async def fetch_users(offset):
+        """
+        Fetch one page of users, passing each one to add_user
+
+        Returns the pagination info, if the Hub paginated the reply.
+        """
+        req = HTTPRequest(
+            url=url_concat(url + '/users', dict(params, offset=offset)),
+            headers=users_headers,
+            decompress_response=True,
+        )
+        resp = await fetch(req)
+        reply = json.loads(resp.body.decode('utf8', 'replace'))
+        if isinstance(reply, dict):
+            page, pagination = reply['items'], reply['_pagination']
+        else:
+            page, pagination = reply, None
+        for user in page:
+            add_user(user)
+        return pagination
+
+    pagination = await fetch_users(0)
+    if pagination:
+        # the first page tells us how many more there are: fetch them all at once
+        limit = pagination['limit']
+        await asyncio.gather(
+            *(
+                fetch_users(offset)
+                for offset in range(pagination['offset'] + limit, pagination['total'], limit)
+            )
+        )
+
+    # Only start culling once every page is fetched:
+    # stopping servers or deleting users shifts the pages still to come.
+    # Handle all users concurrently, bounded by fetch's semaphore.
+    await asyncio.gather(*(log_user(user) for user in users))
+
 
 
 if __name__ == '__main__':
@@ -375,8 +473,17 @@ if __name__ == '__main__':
 
     api_token = os.environ['JUPYTERHUB_API_TOKEN']
 
+    # one shared client for every cull, with room for all of our
+    # concurrent requests (the default is only 10).
+    # curl also keeps connections to the Hub alive between requests.
+    client_options = dict(
+        max_clients=max(10, 2 * options.concurrency),
+        defaults=dict(request_timeout=30),
+    )
     try:
-        AsyncHTTPClient.configure("tornado.curl_httpclient.CurlAsyncHTTPClient")
+        AsyncHTTPClient.configure(
+            "tornado.curl_httpclient.CurlAsyncHTTPClient", **client_options
+        )
     except ImportError as e:
         app_log.warning(
         "Could not load pycurl: %s\n"
@@ -384,6 +491,7 @@ if __name__ == '__main__':
         e,
 
         )
+        AsyncHTTPClient.configure(None, **client_options)
 
     loop = IOLoop.current()
     cull = partial(
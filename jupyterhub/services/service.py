@@ -32,22 +32,24 @@ A hub-managed service with no URL::
 import asyncio
 import copy
 import os
-import pipes
+import shlex
 import shutil
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from subprocess import Popen
 
 from traitlets import Any
 from traitlets import Bool
 from traitlets import default
 from traitlets import Dict
-from traitlets import HasTraits
-from traitlets import Instance
 from traitlets import List
+from traitlets import observe
 from traitlets import Unicode
 from traitlets import validate
 from traitlets.config import LoggingConfigurable
 
-from .. import orm
 from ..objects import Server
 from ..spawner import LocalProcessSpawner
 from ..spawner import set_user_setuid
@@ -55,27 +57,148 @@ from ..traitlets import Command
 from ..utils import url_path_join
 
 
-class _MockUser(HasTraits):
-    name = Unicode()
-    server = Instance(orm.Server, allow_none=True)
-    state = Dict()
-    service = Instance(__name__ + '.Service')
-    host = Unicode()
+class _MockUser:
+    """Stand-in for the User of a managed service's spawner
+
+    A plain class with __slots__, since one is made for every service spawn
+    and traitlets' validation and observers buy us nothing here.
+    """
+
+    __slots__ = ('name', '_server', 'state', 'service', '_host', '_url', '_base_url')
+
+    def __init__(self, name='', server=None, state=None, service=None, host=''):
+        if server is not None and not hasattr(server, 'base_url'):
+            raise TypeError(f"server must be an orm.Server or None, not {server!r}")
+        self.name = name
+        self._server = server
+        self.state = {} if state is None else state
+        self.service = service
+        self._host = host
+        self._url = self._base_url = None
+
+    # url and base_url only depend on server and host,
+    # so compute them once and drop the cached values when those change
+
+    @property
+    def server(self):
+        return self._server
+
+    @server.setter
+    def server(self, server):
+        self._server = server
+        self._url = self._base_url = None
+
+    @property
+    def host(self):
+        return self._host
+
+    @host.setter
+    def host(self, host):
+        self._host = host
+        self._url = self._base_url = None
 
     @property
     def url(self):
-        if not self.server:
-            return ''
-        if self.host:
-            return self.host + self.server.base_url
-        else:
-            return self.server.base_url
+        if self._url is None:
+            if not self.server:
+                self._url = ''
+            elif self.host:
+                self._url = self.host + self.server.base_url
+            else:
+                self._url = self.server.base_url
+        return self._url
 
     @property
     def base_url(self):
-        if not self.server:
-            return ''
-        return self.server.base_url
+        if self._base_url is None:
+            self._base_url = self.server.base_url if self.server else ''
+        return self._base_url
+
+
+# default oauth_scopes by service name,
+# shared by every spawner of the same service (e.g. across restarts)
+_SCOPE_CACHE = {}
+
+# fork/exec of managed services runs here instead of on the Hub's event loop,
+# so the loop stays responsive and several services can be spawned at once.
+# Not used for services with a preexec_fn (setuid), see _ServiceSpawner.start
+_spawn_pool = ThreadPoolExecutor(
+    max_workers=min(32, (os.cpu_count() or 1) * 4),
+    thread_name_prefix='service-spawn',
+)
+
+# running service spawners by pid, notified of their exit via SIGCHLD
+_watched_spawners = {}
+# the event loop our SIGCHLD handler is installed on
+_sigchld_loop = None
+
+
+def _reap_children():
+    """SIGCHLD handler: notify the spawners of services that have exited
+
+    Only our own service processes are reaped (Popen.poll waits on one pid),
+    so other children of the Hub are left to their owners.
+    """
+    for pid, spawner in list(_watched_spawners.items()):
+        if spawner.proc.poll() is not None:
+            _watched_spawners.pop(pid, None)
+            asyncio.ensure_future(spawner.poll_and_notify())
+
+
+def _install_sigchld_handler():
+    """Install the SIGCHLD handler on the running event loop, once
+
+    Returns False if signal handlers can't be used here,
+    e.g. on Windows or when the event loop isn't in the main thread.
+    """
+    global _sigchld_loop
+    loop = asyncio.get_event_loop()
+    if _sigchld_loop is not loop:
+        try:
+            loop.add_signal_handler(signal.SIGCHLD, _reap_children)
+        except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+            return False
+        _sigchld_loop = loop
+    return True
+
+
+# pidfd watches of running services by pid: (event loop, pidfd)
+_pidfd_watches = {}
+
+
+def _watch_pidfd(spawner):
+    """Notify spawner when its process exits, via a pidfd on the event loop
+
+    Each exit wakes only the reader for that process,
+    instead of a SIGCHLD handler checking every service.
+    Returns False if pidfds aren't available (not Linux >= 5.3).
+    """
+    pid = spawner.proc.pid
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        return False
+    loop = asyncio.get_event_loop()
+    try:
+        loop.add_reader(pidfd, _pidfd_exited, pid, spawner)
+    except NotImplementedError:
+        os.close(pidfd)
+        return False
+    _pidfd_watches[pid] = (loop, pidfd)
+    return True
+
+
+def _unwatch_pidfd(pid):
+    watch = _pidfd_watches.pop(pid, None)
+    if watch is not None:
+        loop, pidfd = watch
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+
+
+def _pidfd_exited(pid, spawner):
+    _unwatch_pidfd(pid)
+    asyncio.ensure_future(spawner.poll_and_notify())
 
 
 # We probably shouldn't use a Spawner here,
@@ -91,12 +214,44 @@ class _ServiceSpawner(LocalProcessSpawner):
     cmd = Command(minlen=0)
     _service_name = Unicode()
 
+    @validate("_service_name")
+    def _intern_service_name(self, proposal):
+        # interned, so comparisons and dict lookups by name are pointer checks
+        return sys.intern(proposal.value)
+
     @default("oauth_scopes")
     def _default_oauth_scopes(self):
-        return [
-            "access:services",
-            f"access:services!service={self._service_name}",
-        ]
+        name = self._service_name
+        scopes = _SCOPE_CACHE.get(name)
+        if scopes is None:
+            scopes = _SCOPE_CACHE[name] = (
+                "access:services",
+                sys.intern(f"access:services!service={name}"),
+            )
+        return list(scopes)
+
+    def start_polling(self):
+        """Watch for the service exiting
+        Uses a pidfd or SIGCHLD where available, so an exit is noticed
+        right away without waking up every poll_interval.
+        Falls back on polling otherwise.
+        """
+        if self.proc is None:
+            return super().start_polling()
+        self.stop_polling()
+        if _watch_pidfd(self):
+            return
+        if not _install_sigchld_handler():
+            return super().start_polling()
+        _watched_spawners[self.proc.pid] = self
+        # in case it exited before we were watching
+        _reap_children()
+
+    def stop_polling(self):
+        if self.proc is not None:
+            _unwatch_pidfd(self.proc.pid)
+            _watched_spawners.pop(self.proc.pid, None)
+        super().stop_polling()
 
     def make_preexec_fn(self, name):
         if not name:
@@ -109,7 +264,8 @@ class _ServiceSpawner(LocalProcessSpawner):
             return env
         else:
             return super().user_env(env)
-def start(self):
+
+    async def start(self):
         """Start the process"""
         env = self.get_env()
         # no activity url for services
@@ -118,15 +274,29 @@ def start(self):
             env['SYSTEMROOT'] = os.environ['SYSTEMROOT']
         cmd = self.cmd
 
-        self.log.info("Spawning %s", ' '.join(pipes.quote(s) for s in cmd))
+        self.log.info("Spawning %s", ' '.join(map(shlex.quote, cmd)))
+        # stdout/stderr are inherited from the Hub, not piped,
+        # so service output goes straight to the Hub's log without
+        # passing through Python or the event loop
+        preexec_fn = self.make_preexec_fn(self.user.name)
+        popen = partial(
+            Popen,
+            self.cmd,
+            env=env,
+            preexec_fn=preexec_fn,
+            start_new_session=True,  # don't forward signals
+            cwd=self.cwd or None,
+        )
         try:
-            self.proc = Popen(
-                self.cmd,
-                env=env,
-                preexec_fn=self.make_preexec_fn(self.user.name),
-                start_new_session=True,  # don't forward signals
-                cwd=self.cwd or None,
-            )
+            if preexec_fn is None:
+                self.proc = await asyncio.get_event_loop().run_in_executor(
+                    _spawn_pool, popen
+                )
+            else:
+                # preexec_fn isn't safe to run with other threads forking,
+                # and set_user_setuid isn't async-signal-safe,
+                # so setuid spawns stay on the event loop thread
+                self.proc = popen()
         except PermissionError:
             # use which to get abspath
             script = shutil.which(cmd[0]) or cmd[0]
@@ -303,7 +473,7 @@ class Service(LoggingConfigurable):
     def _default_redirect_uri(self):
         if self.server is None:
             return ''
-        return self.host + url_path_join(self.prefix, 'oauth_callback')
+        return self.host + self.prefix + 'oauth_callback'
 
     @property
     def oauth_available(self):
@@ -323,9 +493,20 @@ class Service(LoggingConfigurable):
         else:
             return None
 
+    # the prefix only depends on base_url and name, so build it once
+    _prefix = Unicode()
+
+    @default('_prefix')
+    def _default_prefix(self):
+        return sys.intern(url_path_join(self.base_url, 'services', self.name + '/'))
+
+    @observe('name', 'base_url')
+    def _rebuild_prefix(self, change):
+        self._prefix = self._default_prefix()
+
     @property
     def prefix(self):
-        return url_path_join(self.base_url, 'services', self.name + '/')
+        return self._prefix
 
     @property
     def proxy_spec(self):
@@ -348,8 +529,7 @@ class Service(LoggingConfigurable):
         if not self.managed:
             raise RuntimeError("Cannot start unmanaged service %s" % self)
         self.log.info("Starting service %r: %r", self.name, self.command)
-        env = {}
-        env.update(self.environment)
+        env = dict(self.environment)
 
         env['JUPYTERHUB_SERVICE_NAME'] = self.name
         if self.url:
@@ -361,7 +541,9 @@ class Service(LoggingConfigurable):
             # if the Hub is listening on all interfaces,
             # tell services to connect via localhost
             # since they are always local subprocesses
-            hub = copy.deepcopy(self.hub)
+            # a shallow copy is enough: HasTraits copies its own trait values,
+            # which are plain strings and ints
+            hub = copy.copy(self.hub)
             hub.connect_url = ''
             hub.connect_ip = '127.0.0.1'
 
@@ -373,7 +555,7 @@ class Service(LoggingConfigurable):
             _service_name=self.name,
             cookie_options=self.cookie_options,
             cwd=self.cwd,
-            hub=self.hub,
+            hub=hub,
             user=_MockUser(
                 name=self.user, service=self, server=self.orm.server, host=self.host
             ),
@@ -383,11 +565,43 @@ class Service(LoggingConfigurable):
         )
         if self.spawner.internal_ssl:
             self.spawner.cert_paths = await self.spawner.create_certs()
-        self.spawner.start()
+        await self.spawner.start()
         self.proc = self.spawner.proc
         self.spawner.add_poll_callback(self._proc_stopped)
         self.spawner.start_polling()
 
+    @classmethod
+    async def start_all(cls, services, concurrency=32):
+        """Start the managed services among `services` concurrently
+        Services are independent, so starting them together takes
+        as long as the slowest one instead of the sum of all of them.
+        At most `concurrency` services are started at once,
+        to avoid running out of file descriptors with many simultaneous spawns.
+        Unmanaged services are skipped.
+        Every service is given the chance to start;
+        each failure is logged, then the first one is raised.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def start(service):
+            async with semaphore:
+                await service.start()
+
+        managed = [service for service in services if service.managed]
+        results = await asyncio.gather(
+            *(start(service) for service in managed), return_exceptions=True
+        )
+        failed = None
+        for service, result in zip(managed, results):
+            if isinstance(result, BaseException):
+                service.log.error(
+                    "Failed to start service %s", service.name, exc_info=result
+                )
+                if failed is None:
+                    failed = result
+        if failed is not None:
+            raise failed
+
     def _proc_stopped(self):
         """Called when the service process unexpectedly exits"""
         self.log.error(